@@ -1,6 +1,14 @@
+import asyncio
 import logging
+import queue
+import re
+import secrets
 import sqlite3
+import threading
+import time
 import os
+from collections import OrderedDict
+from contextlib import contextmanager
 from dotenv import load_dotenv
 load_dotenv(dotenv_path="./habit-tracker.env")
 
@@ -8,7 +16,7 @@ BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 print("Loaded tokens successfully")
 
-from datetime import datetime, timedelta
+from datetime import datetime, date
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import (
     Application,
@@ -20,8 +28,11 @@ from telegram.ext import (
 )
 import google.generativeai as genai
 
-# Configure Gemini AI
-genai.configure(api_key=GEMINI_API_KEY)
+# Configure Gemini AI; the async gRPC transport gives generate_content_async
+# a genuinely non-blocking client and multiplexes every call over one
+# persistent HTTP/2 channel instead of handshaking per request. (The REST
+# transport resolves to a synchronous client that breaks the async calls.)
+genai.configure(api_key=GEMINI_API_KEY, transport='grpc_asyncio')
 # Use Gemini 2.0 Flash - Fast, efficient, and free tier
 model = genai.GenerativeModel('models/gemini-2.0-flash-exp')
 
@@ -34,133 +45,277 @@ logger = logging.getLogger(__name__)
 # Database setup
 DB_NAME = 'habit_tracker.db'
 
+def _open_connection():
+    """Open the shared SQLite connection with performance pragmas applied"""
+    conn = sqlite3.connect(DB_NAME, check_same_thread=False, isolation_level=None,
+                           cached_statements=256)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute('PRAGMA temp_store=MEMORY')
+    conn.execute('PRAGMA cache_size=-64000')
+    conn.execute('PRAGMA busy_timeout=5000')
+    conn.execute('PRAGMA foreign_keys=ON')
+    return conn
+
+# One shared connection for the whole bot: opening the database file per call
+# costs far more than the queries themselves. The lock keeps it safe if
+# handlers ever run from multiple threads.
+_CONN = _open_connection()
+_LOCK = threading.Lock()
+
+def _open_read_connection():
+    """Open one read-only connection for the pool"""
+    conn = sqlite3.connect(f'file:{DB_NAME}?mode=ro', uri=True, check_same_thread=False,
+                           cached_statements=256)
+    conn.execute('PRAGMA temp_store=MEMORY')
+    conn.execute('PRAGMA cache_size=-64000')
+    conn.execute('PRAGMA busy_timeout=5000')
+    return conn
+
+# WAL allows many readers alongside the single writer, so read-only queries
+# borrow from a small pool of their own connections instead of queueing on
+# the writer lock. Four readers is plenty for this bot's concurrency.
+_READ_POOL_SIZE = 4
+_READ_POOL = queue.Queue(maxsize=_READ_POOL_SIZE)
+for _ in range(_READ_POOL_SIZE):
+    _READ_POOL.put(_open_read_connection())
+
+@contextmanager
+def read_conn():
+    """Borrow a read-only connection from the pool"""
+    conn = _READ_POOL.get()
+    try:
+        yield conn
+    finally:
+        _READ_POOL.put(conn)
+
+@contextmanager
+def tx():
+    """Group statements into one explicit transaction (call with _LOCK held)"""
+    _CONN.execute('BEGIN IMMEDIATE')
+    try:
+        yield
+        _CONN.execute('COMMIT')
+    except Exception:
+        _CONN.execute('ROLLBACK')
+        raise
+
 def init_db():
     """Initialize the database"""
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    
-    # Create habits table
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS habits (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            habit_name TEXT NOT NULL,
-            created_date TEXT NOT NULL,
-            UNIQUE(user_id, habit_name)
-        )
-    ''')
-    
-    # Create completions table
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS completions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            habit_id INTEGER NOT NULL,
-            completion_date TEXT NOT NULL,
-            FOREIGN KEY (habit_id) REFERENCES habits (id) ON DELETE CASCADE,
-            UNIQUE(habit_id, completion_date)
-        )
-    ''')
-    
-    conn.commit()
-    conn.close()
+    with _LOCK:
+        # Create habits table
+        _CONN.execute('''
+            CREATE TABLE IF NOT EXISTS habits (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                habit_name TEXT NOT NULL,
+                created_date TEXT NOT NULL,
+                UNIQUE(user_id, habit_name)
+            )
+        ''')
+
+        # Create completions table
+        _CONN.execute('''
+            CREATE TABLE IF NOT EXISTS completions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                habit_id INTEGER NOT NULL,
+                completion_date TEXT NOT NULL,
+                FOREIGN KEY (habit_id) REFERENCES habits (id) ON DELETE CASCADE,
+                UNIQUE(habit_id, completion_date)
+            )
+        ''')
+
+        _CONN.execute('CREATE INDEX IF NOT EXISTS idx_habits_user ON habits(user_id)')
+        _CONN.execute('CREATE INDEX IF NOT EXISTS idx_completions_habit ON completions(habit_id)')
+
+        # Denormalized streak state: last_completion_day holds the ordinal of
+        # the latest completion and current_streak the run ending on that day,
+        # both maintained on insert so reads never touch the completions table.
+        columns = {row[1] for row in _CONN.execute('PRAGMA table_info(habits)')}
+        if 'current_streak' not in columns:
+            with tx():
+                _CONN.execute('ALTER TABLE habits ADD COLUMN current_streak INTEGER NOT NULL DEFAULT 0')
+                _CONN.execute('ALTER TABLE habits ADD COLUMN last_completion_day INTEGER')
+                _backfill_streaks()
+
     logger.info("Database initialized")
 
-def get_user_habits(user_id):
-    """Get all habits for a user"""
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute('SELECT id, habit_name, created_date FROM habits WHERE user_id = ?', (user_id,))
-    habits = c.fetchall()
-    conn.close()
-    return habits
-
-def get_habit_completions(habit_id):
-    """Get all completion dates for a habit"""
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute('SELECT completion_date FROM completions WHERE habit_id = ? ORDER BY completion_date DESC', (habit_id,))
-    dates = [row[0] for row in c.fetchall()]
-    conn.close()
-    return dates
+def _run_length(dates_desc):
+    """Length of the consecutive-day run ending at the latest completion.
 
-def add_habit_to_db(user_id, habit_name):
-    """Add a new habit"""
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    try:
-        c.execute(
-            'INSERT INTO habits (user_id, habit_name, created_date) VALUES (?, ?, ?)',
-            (user_id, habit_name, datetime.now().strftime('%Y-%m-%d'))
-        )
-        conn.commit()
-        success = True
-    except sqlite3.IntegrityError:
-        success = False
-    conn.close()
-    return success
-
-def complete_habit_in_db(user_id, habit_name, date):
-    """Mark a habit as complete for a date"""
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    
-    # Get habit_id
-    c.execute('SELECT id FROM habits WHERE user_id = ? AND habit_name = ?', (user_id, habit_name))
-    result = c.fetchone()
-    
-    if not result:
-        conn.close()
-        return False, "Habit not found"
-    
-    habit_id = result[0]
-    
-    try:
-        c.execute('INSERT INTO completions (habit_id, completion_date) VALUES (?, ?)', (habit_id, date))
-        conn.commit()
-        conn.close()
-        return True, "Completed"
-    except sqlite3.IntegrityError:
-        conn.close()
-        return False, "Already completed"
-
-def delete_habit_from_db(user_id, habit_name):
-    """Delete a habit"""
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute('DELETE FROM habits WHERE user_id = ? AND habit_name = ?', (user_id, habit_name))
-    deleted = c.rowcount > 0
-    conn.commit()
-    conn.close()
-    return deleted
-
-def calculate_streak(dates):
-    """Calculate current streak from list of completion dates"""
-    if not dates:
-        return 0
-    
-    # Sort dates in descending order
-    sorted_dates = sorted([datetime.strptime(d, '%Y-%m-%d').date() for d in dates], reverse=True)
-    
-    today = datetime.now().date()
-    yesterday = today - timedelta(days=1)
-    
-    # Check if completed today or yesterday
-    if sorted_dates[0] not in [today, yesterday]:
-        return 0
-    
+    dates_desc must be ISO dates sorted descending, as the queries return
+    them; comparing ordinals keeps the loop to plain integer work and stops
+    at the first gap.
+    """
     streak = 0
-    current_date = today if sorted_dates[0] == today else yesterday
-    
-    for date in sorted_dates:
-        if date == current_date:
+    expected = date.fromisoformat(dates_desc[0]).toordinal()
+    for d in dates_desc:
+        if date.fromisoformat(d).toordinal() == expected:
             streak += 1
-            current_date -= timedelta(days=1)
+            expected -= 1
         else:
             break
-    
     return streak
 
+def _backfill_streaks():
+    """Populate the streak columns from existing completions (migration only)"""
+    rows = _CONN.execute(
+        'SELECT habit_id, completion_date FROM completions ORDER BY habit_id, completion_date DESC'
+    ).fetchall()
+
+    dates_by_habit = {}
+    for habit_id, completion_date in rows:
+        dates_by_habit.setdefault(habit_id, []).append(completion_date)
+
+    for habit_id, dates in dates_by_habit.items():
+        _CONN.execute(
+            _SQL_UPDATE_STREAK,
+            (_run_length(dates), date.fromisoformat(dates[0]).toordinal(), habit_id)
+        )
+
+# Hot-path statements as module constants: sqlite3 caches prepared statements
+# per (connection, sql-text), so identical strings skip the SQL parse entirely.
+_SQL_GET_HABITS = 'SELECT id, habit_name, created_date FROM habits WHERE user_id = ?'
+_SQL_GET_COMPLETIONS = 'SELECT completion_date FROM completions WHERE habit_id = ? ORDER BY completion_date DESC'
+_SQL_GET_STATS = '''SELECT h.id, h.habit_name, h.current_streak, h.last_completion_day,
+                      (SELECT COUNT(*) FROM completions c WHERE c.habit_id = h.id)
+               FROM habits h
+               WHERE h.user_id = ?
+               ORDER BY h.id'''
+_SQL_ADD_HABIT = 'INSERT OR IGNORE INTO habits (user_id, habit_name, created_date) VALUES (?, ?, ?)'
+_SQL_FIND_HABIT = 'SELECT habit_name, current_streak, last_completion_day FROM habits WHERE id = ? AND user_id = ?'
+_SQL_ADD_COMPLETION = 'INSERT OR IGNORE INTO completions (habit_id, completion_date) VALUES (?, ?)'
+_SQL_UPDATE_STREAK = 'UPDATE habits SET current_streak = ?, last_completion_day = ? WHERE id = ?'
+_SQL_COUNT_COMPLETIONS = 'SELECT COUNT(*) FROM completions WHERE habit_id = ?'
+_SQL_BULK_COMPLETION = '''INSERT OR IGNORE INTO completions (habit_id, completion_date)
+                   SELECT id, ? FROM habits WHERE id = ? AND user_id = ?'''
+_SQL_DELETE_HABIT = 'DELETE FROM habits WHERE id = ? AND user_id = ?'
+_SQL_GET_HABIT_NAME = 'SELECT habit_name FROM habits WHERE id = ? AND user_id = ?'
+
+def get_user_habits(user_id):
+    """Get all habits for a user"""
+    with read_conn() as conn:
+        return conn.execute(_SQL_GET_HABITS, (user_id,)).fetchall()
+
+def get_habit_stats(user_id):
+    """Get per-habit display stats in a single query.
+
+    Returns [(habit_id, habit_name, current_streak, last_completion_day,
+    total_completions)] — everything the list views need without loading
+    individual completion rows.
+    """
+    with read_conn() as conn:
+        return conn.execute(_SQL_GET_STATS, (user_id,)).fetchall()
+
+def effective_streak(current_streak, last_completion_day):
+    """Streak to display now: drops to zero once a full day has been missed"""
+    if last_completion_day is None:
+        return 0
+    if date.today().toordinal() - last_completion_day > 1:
+        return 0
+    return current_streak
+
+def add_habit_to_db(user_id, habit_name):
+    """Add a new habit; returns False if the user already has it"""
+    with _LOCK:
+        with tx():
+            c = _CONN.execute(_SQL_ADD_HABIT, (user_id, habit_name, datetime.now().strftime('%Y-%m-%d')))
+        # INSERT OR IGNORE skips the row on a duplicate, so rowcount tells
+        # new from existing without paying for an exception and rollback
+        return c.rowcount == 1
+
+def complete_habit_in_db(user_id, habit_id, completion_date):
+    """Mark a habit as complete for a date and return its updated state.
+
+    Returns (success, message, habit_name, total_completions, streak); the
+    counters are None when the write did not happen. Looking the habit up by
+    id uses the primary-key index and verifies that user_id owns it.
+    """
+    with _LOCK:
+        # Get the name and current streak state, checking ownership
+        c = _CONN.execute(_SQL_FIND_HABIT, (habit_id, user_id))
+        result = c.fetchone()
+
+        if not result:
+            return False, "Habit not found", None, None, None
+
+        habit_name, current_streak, last_day = result
+        day = date.fromisoformat(completion_date).toordinal()
+
+        with tx():
+            c = _CONN.execute(_SQL_ADD_COMPLETION, (habit_id, completion_date))
+            if c.rowcount == 1:
+                new_streak = current_streak + 1 if last_day == day - 1 else 1
+                _CONN.execute(_SQL_UPDATE_STREAK, (new_streak, day, habit_id))
+                total = _CONN.execute(_SQL_COUNT_COMPLETIONS, (habit_id,)).fetchone()[0]
+
+        # rowcount 0 means INSERT OR IGNORE hit the unique constraint
+        if c.rowcount == 0:
+            return False, "Already completed", habit_name, None, None
+        return True, "Completed", habit_name, total, new_streak
+
+def bulk_complete(user_id, pairs):
+    """Record many (habit_id, completion_date) pairs in one transaction.
+
+    The habit ids must belong to user_id. Duplicates are skipped, and the
+    denormalized streak columns are recomputed for every habit touched so
+    the invariant the read paths rely on holds after a backfill.
+    """
+    with _LOCK:
+        with tx():
+            _CONN.executemany(
+                _SQL_BULK_COMPLETION,
+                [(day, habit_id, user_id) for habit_id, day in pairs]
+            )
+            for habit_id in {habit_id for habit_id, _ in pairs}:
+                dates = [row[0] for row in _CONN.execute(_SQL_GET_COMPLETIONS, (habit_id,))]
+                if dates:
+                    _CONN.execute(
+                        _SQL_UPDATE_STREAK,
+                        (_run_length(dates), date.fromisoformat(dates[0]).toordinal(), habit_id)
+                    )
+
+def delete_habit_from_db(user_id, habit_id):
+    """Delete a habit owned by user_id; returns its name, or None if absent"""
+    with _LOCK:
+        c = _CONN.execute(_SQL_GET_HABIT_NAME, (habit_id, user_id))
+        result = c.fetchone()
+        if not result:
+            return None
+        _CONN.execute(_SQL_DELETE_HABIT, (habit_id, user_id))
+        return result[0]
+
 # AI FUNCTIONS
+
+# Cache Gemini responses in-process: a model call costs a network round-trip
+# while a dict hit is effectively free, and the same prompts recur often.
+# Entries expire after an hour; failures are never cached.
+_AI_CACHE_MAXSIZE = 512
+_AI_CACHE_TTL = 3600  # seconds
+_ai_cache = OrderedDict()
+_ai_cache_lock = asyncio.Lock()
+
+async def _ai_cache_get(key):
+    """Return the cached value for key, or None if missing or expired"""
+    async with _ai_cache_lock:
+        entry = _ai_cache.get(key)
+        if entry is None:
+            return None
+        value, stored_at = entry
+        if time.monotonic() - stored_at > _AI_CACHE_TTL:
+            del _ai_cache[key]
+            return None
+        _ai_cache.move_to_end(key)
+        return value
+
+async def _ai_cache_put(key, value):
+    """Store value under key, evicting the least recently used entries"""
+    async with _ai_cache_lock:
+        _ai_cache[key] = (value, time.monotonic())
+        _ai_cache.move_to_end(key)
+        while len(_ai_cache) > _AI_CACHE_MAXSIZE:
+            _ai_cache.popitem(last=False)
+
 async def extract_habit_from_text(text):
     """Use AI to extract habit from natural language"""
     prompt = f"""Extract the main habit from this text. Return ONLY the habit name in a clear, concise format (2-5 words max).
@@ -173,15 +328,23 @@ Examples:
 User text: "{text}"
 
 Return only the habit name, nothing else:"""
-    
+
+    cache_key = ('extract', text.strip().lower())
+    cached = await _ai_cache_get(cache_key)
+    if cached is not None:
+        return cached
+
     try:
         generation_config = genai.types.GenerationConfig(
             max_output_tokens=50,
             temperature=0.5,
         )
-        response = model.generate_content(prompt, generation_config=generation_config, request_options={'timeout': 10})
+        response = await model.generate_content_async(prompt, generation_config=generation_config, request_options={'timeout': 10})
         habit_name = response.text.strip().strip('"').strip("'")
-        return habit_name if habit_name else None
+        if habit_name:
+            await _ai_cache_put(cache_key, habit_name)
+            return habit_name
+        return None
     except Exception as e:
         logger.error(f"AI extraction error: {e}")
         return None
@@ -195,14 +358,22 @@ Current Streak: {streak} days
 Total Completions: {total_completions}
 
 Make it personal, enthusiastic, and reference the streak if it's notable. Keep it under 50 words."""
-    
+
+    # Bucket long streaks/totals so similar states share a cache entry
+    cache_key = ('motivate', habit_name, min(streak, 30), min(total_completions, 50))
+    cached = await _ai_cache_get(cache_key)
+    if cached is not None:
+        return cached
+
     try:
         generation_config = genai.types.GenerationConfig(
             max_output_tokens=100,
             temperature=0.8,
         )
-        response = model.generate_content(prompt, generation_config=generation_config, request_options={'timeout': 10})
-        return response.text.strip()
+        response = await model.generate_content_async(prompt, generation_config=generation_config, request_options={'timeout': 10})
+        message = response.text.strip()
+        await _ai_cache_put(cache_key, message)
+        return message
     except Exception as e:
         logger.error(f"AI motivation error: {e}")
         # Fallback motivational messages
@@ -213,58 +384,80 @@ Make it personal, enthusiastic, and reference the streak if it's notable. Keep i
         else:
             return "Great job! Every completion counts towards your success! 🎉"
 
-async def ai_chat_assistant(user_message, user_habits_data):
-    """AI assistant that answers questions about habits"""
-    habits_summary = "\n".join([f"- {h[1]} (Streak: {calculate_streak(get_habit_completions(h[0]))} days)" 
-                                 for h in user_habits_data]) if user_habits_data else "No habits yet"
-    
-    prompt = f"""You are a helpful habit-building coach. The user has these habits:
+# Prompt skeleton for the chat assistant, built once at import
+_CHAT_PROMPT = """You are a helpful habit-building coach. The user has these habits:
 {habits_summary}
 
 User question: "{user_message}"
 
 Provide a helpful, concise response (2-3 sentences max). Be encouraging and actionable. If they ask about their habits, reference their actual data."""
-    
+
+async def ai_chat_assistant(user_message, habits):
+    """AI assistant that answers questions about habits.
+
+    habits is a list of already-fetched (habit_name, streak) tuples, so
+    building the prompt does no DB work of its own.
+    """
+    habits_summary = "\n".join(
+        f"- {name} (Streak: {streak} days)" for name, streak in habits
+    ) if habits else "No habits yet"
+
+    prompt = _CHAT_PROMPT.format(habits_summary=habits_summary, user_message=user_message)
+
     try:
         # Set timeout and generation config for faster response
         generation_config = genai.types.GenerationConfig(
             max_output_tokens=200,
             temperature=0.7,
         )
-        response = model.generate_content(prompt, generation_config=generation_config, request_options={'timeout': 10})
+        response = await model.generate_content_async(prompt, generation_config=generation_config, request_options={'timeout': 10})
         return response.text.strip()
     except Exception as e:
         logger.error(f"AI chat error: {e}")
         return "I'm having trouble getting a response right now. Try a simpler question or try again in a moment!"
 
 # COMMAND HANDLERS
+
+# Static replies, built once at import instead of on every invocation
+_WELCOME_TEXT = (
+    "🎯 *Welcome to AI Habit Tracker Bot!*\n\n"
+    "Build better habits with AI-powered insights!\n\n"
+    "📋 *Available Commands:*\n\n"
+    "🆕 *Getting Started:*\n"
+    "/addhabit <name> - Add a new habit\n"
+    "   Example: /addhabit Exercise\n\n"
+    "📊 *Track Your Progress:*\n"
+    "/myhabits - View all your habits\n"
+    "/complete - Mark a habit as done today\n"
+    "/stats - View detailed statistics\n\n"
+    "🤖 *AI Features:*\n"
+    "/ask <question> - Ask AI for advice\n"
+    "   Example: /ask How stay consistent?\n\n"
+    "⚙️ *Manage:*\n"
+    "/deletehabit - Remove a habit\n"
+    "/clr - Clear and reset chat\n"
+    "/help - Show this message again\n\n"
+    "💡 *Pro Tip:* Just chat naturally!\n"
+    "• 'I want to start meditating'\n"
+    "• 'Help me build a reading habit'\n"
+    "• 'Why am I struggling with my habits?'\n\n"
+    "Let's start building great habits! 💪"
+)
+
+_CLEAR_TEXT = (
+    "🧹 *Chat Cleared!*\n\n"
+    "Starting fresh! Your habits are still saved.\n\n"
+    "📋 *Quick Commands:*\n"
+    "/myhabits - See your habits\n"
+    "/complete - Mark habits done\n"
+    "/stats - View your progress\n"
+    "/help - Show all commands\n\n"
+    "Ready to continue your journey! 💪"
+)
+
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Send welcome message"""
-    welcome_text = (
-        "🎯 *Welcome to AI Habit Tracker Bot!*\n\n"
-        "Build better habits with AI-powered insights!\n\n"
-        "📋 *Available Commands:*\n\n"
-        "🆕 *Getting Started:*\n"
-        "/addhabit <name> - Add a new habit\n"
-        "   Example: /addhabit Exercise\n\n"
-        "📊 *Track Your Progress:*\n"
-        "/myhabits - View all your habits\n"
-        "/complete - Mark a habit as done today\n"
-        "/stats - View detailed statistics\n\n"
-        "🤖 *AI Features:*\n"
-        "/ask <question> - Ask AI for advice\n"
-        "   Example: /ask How stay consistent?\n\n"
-        "⚙️ *Manage:*\n"
-        "/deletehabit - Remove a habit\n"
-        "/clr - Clear and reset chat\n"
-        "/help - Show this message again\n\n"
-        "💡 *Pro Tip:* Just chat naturally!\n"
-        "• 'I want to start meditating'\n"
-        "• 'Help me build a reading habit'\n"
-        "• 'Why am I struggling with my habits?'\n\n"
-        "Let's start building great habits! 💪"
-    )
-    await update.message.reply_text(welcome_text, parse_mode='Markdown')
+    await update.message.reply_text(_WELCOME_TEXT, parse_mode='Markdown')
 
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Show help message"""
@@ -284,7 +477,7 @@ async def add_habit(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     habit_name = ' '.join(context.args).strip()
     
-    if add_habit_to_db(user_id, habit_name):
+    if await asyncio.to_thread(add_habit_to_db, user_id, habit_name):
         await update.message.reply_text(
             f"✅ Habit '{habit_name}' added successfully!\n\n"
             f"Use /complete to mark it as done today."
@@ -297,53 +490,51 @@ async def add_habit(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def my_habits(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Show all habits with streaks"""
     user_id = update.effective_user.id
-    habits = get_user_habits(user_id)
-    
+    habits = await asyncio.to_thread(get_habit_stats, user_id)
+
     if not habits:
         await update.message.reply_text(
             "You don't have any habits yet.\n"
             "Use /addhabit to create one, or just tell me what habit you want to build!"
         )
         return
-    
-    today = datetime.now().date().strftime('%Y-%m-%d')
-    message = "📊 *Your Habits:*\n\n"
-    
-    for habit_id, habit_name, created_date in habits:
-        dates = get_habit_completions(habit_id)
-        streak = calculate_streak(dates)
-        completed_today = today in dates
-        status = "✅" if completed_today else "⭕"
-        
-        message += f"{status} *{habit_name}*\n"
-        message += f"   🔥 Streak: {streak} days\n"
-        message += f"   📅 Total: {len(dates)} days\n\n"
-    
-    await update.message.reply_text(message, parse_mode='Markdown')
+
+    today_day = date.today().toordinal()
+    parts = ["📊 *Your Habits:*\n\n"]
+
+    for _, habit_name, current_streak, last_day, total in habits:
+        streak = effective_streak(current_streak, last_day)
+        status = "✅" if last_day == today_day else "⭕"
+
+        parts.append(
+            f"{status} *{habit_name}*\n"
+            f"   🔥 Streak: {streak} days\n"
+            f"   📅 Total: {total} days\n\n"
+        )
+
+    await update.message.reply_text("".join(parts), parse_mode='Markdown')
 
 async def complete_habit(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Show buttons to mark habits as complete"""
     user_id = update.effective_user.id
-    habits = get_user_habits(user_id)
-    
+    habits = await asyncio.to_thread(get_habit_stats, user_id)
+
     if not habits:
         await update.message.reply_text(
             "You don't have any habits yet.\n"
             "Use /addhabit to create one!"
         )
         return
-    
-    today = datetime.now().date().strftime('%Y-%m-%d')
+
+    today_day = date.today().toordinal()
     keyboard = []
-    
-    for habit_id, habit_name, _ in habits:
-        dates = get_habit_completions(habit_id)
-        completed_today = today in dates
-        emoji = "✅" if completed_today else "⭕"
+
+    for habit_id, habit_name, _, last_day, _ in habits:
+        emoji = "✅" if last_day == today_day else "⭕"
         keyboard.append([
             InlineKeyboardButton(
                 f"{emoji} {habit_name}",
-                callback_data=f"complete:{habit_name}"
+                callback_data=f"c:{habit_id}"
             )
         ])
     
@@ -360,29 +551,23 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     user_id = update.effective_user.id
     
-    if query.data.startswith("complete:"):
-        habit_name = query.data.split(":", 1)[1]
+    if query.data.startswith("c:"):
+        habit_id = int(query.data.split(":", 1)[1])
         today = datetime.now().date().strftime('%Y-%m-%d')
-        
-        success, message = complete_habit_in_db(user_id, habit_name, today)
-        
+
+        success, message, habit_name, total, streak = await asyncio.to_thread(
+            complete_habit_in_db, user_id, habit_id, today
+        )
+
         if success:
-            # Get updated streak
-            habits = get_user_habits(user_id)
-            for habit_id, h_name, _ in habits:
-                if h_name == habit_name:
-                    dates = get_habit_completions(habit_id)
-                    streak = calculate_streak(dates)
-                    
-                    # Generate AI motivation
-                    ai_message = await generate_motivation(habit_name, streak, len(dates))
-                    
-                    await query.edit_message_text(
-                        f"🎉 '{habit_name}' completed!\n\n"
-                        f"🔥 Streak: {streak} days | 📅 Total: {len(dates)}\n\n"
-                        f"💬 {ai_message}"
-                    )
-                    break
+            # Generate AI motivation from the state the write just returned
+            ai_message = await generate_motivation(habit_name, streak, total)
+
+            await query.edit_message_text(
+                f"🎉 '{habit_name}' completed!\n\n"
+                f"🔥 Streak: {streak} days | 📅 Total: {total}\n\n"
+                f"💬 {ai_message}"
+            )
         else:
             if message == "Already completed":
                 await query.edit_message_text(
@@ -392,10 +577,11 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
             else:
                 await query.edit_message_text(f"❌ {message}")
     
-    elif query.data.startswith("delete:"):
-        habit_name = query.data.split(":", 1)[1]
-        
-        if delete_habit_from_db(user_id, habit_name):
+    elif query.data.startswith("d:"):
+        habit_id = int(query.data.split(":", 1)[1])
+
+        habit_name = await asyncio.to_thread(delete_habit_from_db, user_id, habit_id)
+        if habit_name:
             await query.edit_message_text(f"🗑️ Habit '{habit_name}' deleted.")
         else:
             await query.edit_message_text("❌ Habit not found!")
@@ -403,43 +589,46 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Show detailed statistics"""
     user_id = update.effective_user.id
-    habits = get_user_habits(user_id)
-    
+    habits = await asyncio.to_thread(get_habit_stats, user_id)
+
     if not habits:
         await update.message.reply_text(
             "You don't have any habits yet.\n"
             "Use /addhabit to create one!"
         )
         return
-    
+
     habit_data = []
     total_completions = 0
     max_streak = 0
-    
-    for habit_id, habit_name, created_date in habits:
-        dates = get_habit_completions(habit_id)
-        streak = calculate_streak(dates)
-        total_completions += len(dates)
+
+    for _, habit_name, current_streak, last_day, total in habits:
+        streak = effective_streak(current_streak, last_day)
+        total_completions += total
         max_streak = max(max_streak, streak)
-        habit_data.append((habit_name, streak, len(dates)))
-    
-    message = "📈 *Your Statistics:*\n\n"
-    message += f"📊 Total Habits: {len(habits)}\n"
-    message += f"✅ Total Completions: {total_completions}\n"
-    message += f"🔥 Best Streak: {max_streak} days\n\n"
-    message += "*Habit Details:*\n\n"
+        habit_data.append((habit_name, streak, total))
     
+    parts = [
+        "📈 *Your Statistics:*\n\n"
+        f"📊 Total Habits: {len(habits)}\n"
+        f"✅ Total Completions: {total_completions}\n"
+        f"🔥 Best Streak: {max_streak} days\n\n"
+        "*Habit Details:*\n\n"
+    ]
+
     # Sort by streak (descending)
     for habit_name, streak, total in sorted(habit_data, key=lambda x: x[1], reverse=True):
-        message += f"• *{habit_name}*\n"
-        message += f"  Streak: {streak} 🔥 | Total: {total} ✅\n\n"
-    
-    await update.message.reply_text(message, parse_mode='Markdown')
+        parts.append(
+            f"• *{habit_name}*\n"
+            f"  Streak: {streak} 🔥 | Total: {total} ✅\n\n"
+        )
+
+    await update.message.reply_text("".join(parts), parse_mode='Markdown')
 
 async def delete_habit(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Show buttons to delete habits"""
     user_id = update.effective_user.id
-    habits = get_user_habits(user_id)
+    habits = await asyncio.to_thread(get_user_habits, user_id)
     
     if not habits:
         await update.message.reply_text(
@@ -449,11 +638,11 @@ async def delete_habit(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     
     keyboard = []
-    for _, habit_name, _ in habits:
+    for habit_id, habit_name, _ in habits:
         keyboard.append([
             InlineKeyboardButton(
                 f"🗑️ {habit_name}",
-                callback_data=f"delete:{habit_name}"
+                callback_data=f"d:{habit_id}"
             )
         ])
     
@@ -478,47 +667,54 @@ async def ask_ai(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     
     question = ' '.join(context.args)
-    habits = get_user_habits(user_id)
-    
-    await update.message.reply_text("🤔 Thinking...")
-    
-    response = await ai_chat_assistant(question, habits)
+    habits = await asyncio.to_thread(get_habit_stats, user_id)
+    summaries = [
+        (name, effective_streak(streak, last_day))
+        for _, name, streak, last_day, _ in habits
+    ]
+
+    # Send the placeholder and query Gemini concurrently
+    _, response = await asyncio.gather(
+        update.message.reply_text("🤔 Thinking..."),
+        ai_chat_assistant(question, summaries)
+    )
     await update.message.reply_text(f"💡 {response}")
 
 async def clear_chat(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Clear the chat and show fresh start message"""
-    clear_text = (
-        "🧹 *Chat Cleared!*\n\n"
-        "Starting fresh! Your habits are still saved.\n\n"
-        "📋 *Quick Commands:*\n"
-        "/myhabits - See your habits\n"
-        "/complete - Mark habits done\n"
-        "/stats - View your progress\n"
-        "/help - Show all commands\n\n"
-        "Ready to continue your journey! 💪"
-    )
-    await update.message.reply_text(clear_text, parse_mode='Markdown')
+    await update.message.reply_text(_CLEAR_TEXT, parse_mode='Markdown')
+
+# Phrases that suggest habit creation, compiled once so every incoming
+# message is checked in a single case-insensitive scan instead of one
+# substring search per keyword on a lowercased copy.
+_HABIT_RE = re.compile(r'\b(want to|need to|should|help me|start|build|create habit)\b', re.IGNORECASE)
 
 async def handle_natural_language(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle natural language messages for habit creation and chat"""
     user_id = update.effective_user.id
-    text = update.message.text.lower()
-    
-    # Keywords that suggest habit creation
-    habit_keywords = ['want to', 'need to', 'should', 'help me', 'start', 'build', 'create habit']
-    
-    if any(keyword in text for keyword in habit_keywords):
-        # Try to extract habit
-        await update.message.reply_text("🤔 Let me understand that...")
-        
-        habit_name = await extract_habit_from_text(update.message.text)
-        
+
+    if _HABIT_RE.search(update.message.text):
+        # Send the placeholder and try to extract the habit concurrently
+        _, habit_name = await asyncio.gather(
+            update.message.reply_text("🤔 Let me understand that..."),
+            extract_habit_from_text(update.message.text)
+        )
+
         if habit_name:
-            # Ask for confirmation
+            # Ask for confirmation. callback_data is capped at 64 bytes, so
+            # park the name in user_data under a short token instead of
+            # sending it inline where long names would be truncated.
+            token = secrets.token_hex(3)
+            pending = context.user_data.setdefault('pending_habits', {})
+            # Abandoned confirmations would otherwise pile up forever; keep
+            # only the few most recent per user (dicts preserve insert order)
+            while len(pending) >= 8:
+                pending.pop(next(iter(pending)))
+            pending[token] = habit_name
             keyboard = [
                 [
-                    InlineKeyboardButton("✅ Yes, add it!", callback_data=f"add_habit:{habit_name}"),
-                    InlineKeyboardButton("❌ No, cancel", callback_data="cancel_add")
+                    InlineKeyboardButton("✅ Yes, add it!", callback_data=f"add:{token}"),
+                    InlineKeyboardButton("❌ No, cancel", callback_data=f"cancel:{token}")
                 ]
             ]
             reply_markup = InlineKeyboardMarkup(keyboard)
@@ -537,10 +733,15 @@ async def handle_natural_language(update: Update, context: ContextTypes.DEFAULT_
             )
     else:
         # General question - use AI assistant
-        habits = get_user_habits(user_id)
-        await update.message.reply_text("💭 Let me think about that...")
-        
-        response = await ai_chat_assistant(update.message.text, habits)
+        habits = await asyncio.to_thread(get_habit_stats, user_id)
+        summaries = [
+            (name, effective_streak(streak, last_day))
+            for _, name, streak, last_day, _ in habits
+        ]
+        _, response = await asyncio.gather(
+            update.message.reply_text("💭 Let me think about that..."),
+            ai_chat_assistant(update.message.text, summaries)
+        )
         await update.message.reply_text(f"💡 {response}")
 
 async def handle_habit_confirmation(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -550,10 +751,15 @@ async def handle_habit_confirmation(update: Update, context: ContextTypes.DEFAUL
     
     user_id = update.effective_user.id
     
-    if query.data.startswith("add_habit:"):
-        habit_name = query.data.split(":", 1)[1]
-        
-        if add_habit_to_db(user_id, habit_name):
+    if query.data.startswith("add:"):
+        token = query.data.split(":", 1)[1]
+        habit_name = context.user_data.get('pending_habits', {}).pop(token, None)
+
+        if habit_name is None:
+            await query.edit_message_text("❌ That confirmation has expired. Please try again!")
+            return
+
+        if await asyncio.to_thread(add_habit_to_db, user_id, habit_name):
             await query.edit_message_text(
                 f"✅ Great! '{habit_name}' has been added to your habits!\n\n"
                 f"Use /complete to mark it as done today."
@@ -563,7 +769,9 @@ async def handle_habit_confirmation(update: Update, context: ContextTypes.DEFAUL
                 f"⚠️ You already have a habit called '{habit_name}'!"
             )
     
-    elif query.data == "cancel_add":
+    elif query.data.startswith("cancel:"):
+        token = query.data.split(":", 1)[1]
+        context.user_data.get('pending_habits', {}).pop(token, None)
         await query.edit_message_text("❌ Cancelled. No habit was added.")
 
 def main():
@@ -571,8 +779,15 @@ def main():
     # Initialize database
     init_db()
     
-    # Create application
-    application = Application.builder().token(BOT_TOKEN).build()
+    # Create application; fail fast on a stuck Telegram connection
+    application = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .connect_timeout(5)
+        .read_timeout(10)
+        .pool_timeout(5)
+        .build()
+    )
     
     # Register handlers
     application.add_handler(CommandHandler("start", start))
@@ -586,8 +801,8 @@ def main():
     application.add_handler(CommandHandler("clr", clear_chat))
     
     # Handle button callbacks
-    application.add_handler(CallbackQueryHandler(button_callback, pattern="^(complete:|delete:)"))
-    application.add_handler(CallbackQueryHandler(handle_habit_confirmation, pattern="^(add_habit:|cancel_add)"))
+    application.add_handler(CallbackQueryHandler(button_callback, pattern="^(c:|d:)"))
+    application.add_handler(CallbackQueryHandler(handle_habit_confirmation, pattern="^(add:|cancel:)"))
     
     # Handle natural language (must be last)
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_natural_language))